@@ -13,39 +13,55 @@ class ClassNode:
         self.children = []
         self.type_sort = type_sort
         self._qf = None
-
-    def find(self, name):
-        """
-        Looks a class with the given name in the tree starting at this node. If there is
-        no such class, returns None.
-        """
-        if name == self.name:
-            return self
-        for c in self.children:
-            res = c.find(name)
-            if res:
-                return res
+        self._constr = None
+        self._accessors = None
+        self._all_children = None
+        self._all_parents = None
 
     def __str__(self):
         return str(self.name)
 
     def all_children(self):
         """
-        Returns all transitive child nodes.
+        Returns all transitive child nodes, including this one.
         """
-        result = {self}
-        for c in self.children:
-            result.update(c.all_children())
-        return result
+        return self._all_children
 
     def all_parents(self):
         """
-        Returns all transitive parent nodes.
+        Returns all transitive parent nodes, including this one.
+        """
+        return self._all_parents
+
+    def set_closures(self, all_children, all_parents):
+        """
+        Sets the transitive child and parent nodes of this node. Called once by
+        Z3Types.create_class_tree when the tree is complete.
+        """
+        self._all_children = frozenset(all_children)
+        self._all_parents = frozenset(all_parents)
+
+    def constructor(self):
+        """
+        Returns the Z3 constructor of this type. The constructor is resolved on the
+        type sort only once and reused afterwards.
+        """
+        if self._constr is None:
+            name = self.name if isinstance(self.name, str) else self.name[0]
+            self._constr = getattr(self.type_sort, name)
+        return self._constr
+
+    def accessors(self):
+        """
+        Returns the Z3 accessor functions for the parameters of this type, in order.
+        Like the constructor, they are resolved on the type sort only once.
         """
-        result = {self}
-        for parent in self.parents:
-            result.update(parent.all_parents())
-        return result
+        if self._accessors is None:
+            if isinstance(self.name, str):
+                self._accessors = []
+            else:
+                self._accessors = [getattr(self.type_sort, arg) for arg in self.name[1:]]
+        return self._accessors
 
     def get_literal(self, transformer = None):
         """
@@ -53,9 +69,9 @@ class ClassNode:
         will use the variables from self.quantified() as the type arguments.
         """
         if isinstance(self.name, str):
-            return getattr(self.type_sort, self.name)
+            return self.constructor()
         else:
-            constr = getattr(self.type_sort, self.name[0])
+            constr = self.constructor()
             args = self.quantified()
             if transformer:
                 args = [transformer(a) if not isinstance(a, ArithRef) else a for a in args]
@@ -68,22 +84,21 @@ class ClassNode:
         variable argument to get the arguments.
         """
         if isinstance(self.name, str):
-            return getattr(self.type_sort, self.name)
+            return self.constructor()
         else:
-            constr = getattr(self.type_sort, self.name[0])
+            constr = self.constructor()
             args = []
-            for arg in self.name[1:]:
-                args.append(getattr(self.type_sort, arg)(var))
+            for accessor in self.accessors():
+                args.append(accessor(var))
             return constr(*args)
 
     def get_quantified_with_args(self, var):
         if isinstance(self.name, str):
             return []
         else:
-            constr = getattr(self.type_sort, self.name[0])
             args = []
-            for arg in self.name[1:]:
-                args.append(getattr(self.type_sort, arg)(var))
+            for accessor in self.accessors():
+                args.append(accessor(var))
             return args
 
     def quantified(self):
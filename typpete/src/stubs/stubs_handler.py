@@ -21,13 +21,13 @@ class StubsHandler:
             STUB_ASTS[path] = tree
             self.asts.append(tree)
 
-        for method in paths.methods:
-            path = cur_directory + '/' + method["path"]
+        for method_type in paths.methods:
+            path = cur_directory + '/' + paths.methods[method_type]
             r = open(path)
             tree = ast.parse(r.read())
             r.close()
             STUB_ASTS[path] = tree
-            tree.method_type = method["type"]
+            tree.method_type = method_type
             self.methods_asts.append(tree)
 
         for lib in paths.libraries:
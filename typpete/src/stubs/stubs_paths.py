@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 classes_and_functions = [
     "functions.py",
 ]
@@ -14,21 +16,11 @@ libraries = {
     "abc": "libraries/abc.py",
 }
 
-methods = [
-    {
-        "type": "list",
-        "path": "list_methods.py"
-    },
-    {
-        "type": "str",
-        "path": "str_methods.py"
-    },
-    {
-        "type": "dict",
-        "path": "dict_methods.py"
-    },
-    {
-        "type": "set",
-        "path": "set_methods.py"
-    }
-]
+# Maps each builtin type to the stub file of its methods. Ordered, so that the stubs
+# are inferred in the same order on every Python version.
+methods = OrderedDict([
+    ("list", "list_methods.py"),
+    ("str", "str_methods.py"),
+    ("dict", "dict_methods.py"),
+    ("set", "set_methods.py"),
+])
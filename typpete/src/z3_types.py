@@ -18,21 +18,21 @@ from z3 import *
 class Dummy():
     pass
 
-set_param("auto-config", False)
-set_param("smt.mbqi", False)
-set_param("model.v2", True)
-set_param("smt.phase_selection", 0)
-set_param("smt.restart_strategy", 0)
-set_param("smt.restart_factor", 1.5)
-set_param("smt.arith.random_initial_value", True)
-set_param("smt.case_split", 3)
-set_param("smt.delay_units", True)
-set_param("smt.delay_units_threshold", 16)
-set_param("nnf.sk_hack", True)
-set_param("smt.qi.eager_threshold", 100)
-set_param("smt.qi.cost",  "(+ weight generation)")
-set_param("type_check", True)
-set_param("smt.bv.reflect", True)
+set_param("auto-config", False,
+          "smt.mbqi", False,
+          "model.v2", True,
+          "smt.phase_selection", 0,
+          "smt.restart_strategy", 0,
+          "smt.restart_factor", 1.5,
+          "smt.arith.random_initial_value", True,
+          "smt.case_split", 3,
+          "smt.delay_units", True,
+          "smt.delay_units_threshold", 16,
+          "nnf.sk_hack", True,
+          "smt.qi.eager_threshold", 100,
+          "smt.qi.cost", "(+ weight generation)",
+          "type_check", True,
+          "smt.bv.reflect", True)
 # set_option(":smt.qi.profile", True)
 # set_param(verbose=10)
 
@@ -63,6 +63,7 @@ class TypesSolver(Solver):
             class_type_params = {}
         self.config = analyzer.get_all_configurations(class_type_params, type_params)
         self.z3_types = Z3Types(self.config, self)
+        self._default_sort = self.z3_types.type_sort
 
         self.z3_types.abstract_types = self.config.abstract_classes
         for cls in self.z3_types.classes:
@@ -98,15 +99,12 @@ class TypesSolver(Solver):
     def infer_stubs(self, context, infer_func):
         self.stubs_handler.infer_all_files(context, self, self.config.used_names, infer_func)
 
-    def new_element_id(self):
-        self.element_id += 1
-        return self.element_id
-
     def new_z3_const(self, name, sort=None):
         """Create a new Z3 constant with a unique name."""
         if sort is None:
-            sort = self.z3_types.type_sort
-        return Const("{}_{}".format(name, self.new_element_id()), sort)
+            sort = self._default_sort
+        self.element_id += 1
+        return Const(name + "_" + str(self.element_id), sort)
 
     def resolve_annotation(self, annotation, module):
         return self.annotation_resolver.resolve(annotation, self, module)
@@ -153,7 +151,7 @@ class Z3Types:
         self.tuple = type_sort.tuple
         self.tuples = list()
         for cur_len in range(max_tuple_length + 1):
-            self.tuples.append(getattr(type_sort, "tuple_{}".format(cur_len)))
+            self.tuples.append(getattr(type_sort, "tuple_" + str(cur_len)))
         self.list = type_sort.list
         self.list_type = type_sort.list_arg_0
         # sets
@@ -166,11 +164,11 @@ class Z3Types:
         # functions
         self.funcs = list()
         for cur_len in range(max_function_args + 1):
-            self.funcs.append(getattr(type_sort, "func_{}".format(cur_len)))
+            self.funcs.append(getattr(type_sort, "func_" + str(cur_len)))
         # classes
         self.classes = OrderedDict()
         for cls in classes_to_instance_attrs:
-            key = "class_{}".format(cls) if cls not in ALIASES else ALIASES[cls]
+            key = "class_" + cls if cls not in ALIASES else ALIASES[cls]
             self.classes[cls] = getattr(type_sort, key)
         create_classes_attributes(type_sort, classes_to_instance_attrs, self.instance_attributes)
         create_classes_attributes(type_sort, classes_to_class_attrs, self.class_attributes)
@@ -270,30 +268,56 @@ class Z3Types:
         """
         Creates a tree consisting of ClassNodes which contains all classes in all_classes,
         where child nodes are subclasses. The root will be object.
+
+        Bases are resolved by name while the tree is being built. The transitive child
+        and parent nodes of every node are computed once at the end, when the tree is complete.
+
+        Raises a TypeError if some classes have a base which is not in all_classes.
         """
         graph = ClassNode('object', [], type_sort)
-        to_cover = list(all_classes.keys())
-        covered = {'object'}
+        nodes = {'object': graph}
+        # Add every class only after all of its bases: count the bases of each class
+        # which are not in the tree yet, and remember which classes wait for each base.
+        pending = {}
+        waiting = {}
+        to_cover = []
+        for current, bases in all_classes.items():
+            pending[current] = 0
+            for base in bases:
+                if base != 'object':
+                    pending[current] += 1
+                    waiting.setdefault(base, []).append(current)
+            if pending[current] == 0:
+                to_cover.append(current)
         i = 0
         while i < len(to_cover):
             current = to_cover[i]
             i += 1
-            bases = all_classes[current]
-            cont = False
-            for base in bases:
-                if base not in covered:
-                    cont = True
-                    break
-            if cont:
-                to_cover.append(current)
-                continue
-
             current_node = ClassNode(current, [], type_sort)
-            for base in bases:
-                base_node = graph.find(base)
+            for base in all_classes[current]:
+                base_node = nodes[base]
                 current_node.parents.append(base_node)
                 base_node.children.append(current_node)
-            covered.add(current)
+            nodes[current] = current_node
+            for sub in waiting.get(current, []):
+                pending[sub] -= 1
+                if pending[sub] == 0:
+                    to_cover.append(sub)
+        if len(nodes) - 1 < len(all_classes):
+            missing = [str(cls) for cls in all_classes if pending[cls] != 0]
+            raise TypeError("Cannot resolve the base classes of {}".format(", ".join(missing)))
+
+        # Every class comes after its bases in to_cover, so the parents of a node are
+        # known when it is reached, and its children when it is reached in reverse.
+        ordered = [graph] + [nodes[current] for current in to_cover]
+        all_parents = {}
+        for node in ordered:
+            all_parents[node] = {node}.union(*[all_parents[base] for base in node.parents])
+        all_children = {}
+        for node in reversed(ordered):
+            all_children[node] = {node}.union(*[all_children[sub] for sub in node.children])
+        for node in ordered:
+            node.set_closures(all_children[node], all_parents[node])
         return graph
 
     def create_subst_axioms(self, tree):
@@ -359,24 +383,32 @@ class Z3Types:
         Creates axioms defining subtype relations for all possible classes.
         """
         axioms = []
-        x = self.new_z3_const("x", self.type_sort)
+        type_sort = self.type_sort
+        none_subtype_of_all = config["none_subtype_of_all"]
+        x = self.new_z3_const("x", type_sort)
         m = self.new_z3_const('m', self.method_sort)
+        # The methods in which each type variable is in scope do not depend on the class
+        tvs_in_scope = {tv: Or(*[m == m_tv for m_tv in self.tv_to_method[tv]]) for tv in self.tvs}
         # For each class C in the program, create two axioms:
         for c in tree.all_children():
             c_literal = c.get_literal()
+            quantified = c.quantified()
+            # Handle tuples and functions variance
+            is_variant = isinstance(c.name, tuple) and (c.name[0].startswith("tuple") or c.name[0].startswith("func"))
+            if is_variant:
+                # Get the accessors of X, shared by both axioms
+                accessors = []
+                for accessor in c.accessors():
+                    accessors.append(accessor(x))
+                x_is_c = x == c.constructor()(*accessors)
+
             # One which is triggered by subtype(C, X)
             # Check whether to make non subtype of everything or not
-            if c.name != 'none' or c.name == 'none' and not config["none_subtype_of_all"]:
-                # Handle tuples and functions variance
-                if isinstance(c.name, tuple) and (c.name[0].startswith("tuple") or c.name[0].startswith("func")):
-                    # Get the accessors of X
-                    accessors = []
-                    for acc_name in c.name[1:]:
-                        accessors.append(getattr(self.type_sort, acc_name)(x))
-
+            if c.name != 'none' or c.name == 'none' and not none_subtype_of_all:
+                if is_variant:
                     # Add subtype relationship between args of X and C
                     args_sub = []
-                    consts = c.quantified()
+                    consts = quantified
 
                     if c.name[0].startswith("tuple"):
                         for i, accessor in enumerate(accessors):
@@ -386,28 +418,21 @@ class Z3Types:
                             args_sub.append(self.subtype(accessor, consts[i + 1]))
                         args_sub.append(self.subtype(consts[-1], accessors[-1]))
 
-                    options = [
-                        And(x == getattr(self.type_sort, c.name[0])(*accessors), *args_sub)
-                    ]
+                    options = [And(x_is_c, *args_sub)]
                 else:
                     options = []
-                for base in c.all_parents():
-                    options.append(x == base.get_literal())
+                options.extend(x == base.get_literal() for base in c.all_parents())
                 subtype_expr = self._subtype(m, c_literal, x)
-                axiom = ForAll([x, m] + c.quantified(), subtype_expr == Or(*options),
+                axiom = ForAll([x, m] + quantified, subtype_expr == Or(*options),
                                patterns=[subtype_expr])
                 axioms.append(axiom)
 
             # And one which is triggered by subtype(X, C)
-            options = [x == self.type_sort.none] if config["none_subtype_of_all"] else []
-            if isinstance(c.name, tuple) and (c.name[0].startswith("tuple") or c.name[0].startswith("func")):
+            options = [x == type_sort.none] if none_subtype_of_all else []
+            if is_variant:
                 # Handle tuples and functions variance as above
-                accessors = []
-                for acc_name in c.name[1:]:
-                    accessors.append(getattr(self.type_sort, acc_name)(x))
-
                 args_sub = []
-                consts = c.quantified()
+                consts = quantified
 
                 if c.name[0].startswith("tuple"):
                     for i, accessor in enumerate(accessors):
@@ -417,23 +442,19 @@ class Z3Types:
                         args_sub.append(self.subtype(consts[i + 1], accessor))
                     args_sub.append(self.subtype(accessors[-1], consts[-1]))
 
-                options.append(And(x == getattr(self.type_sort, c.name[0])(*accessors), *args_sub))
+                options.append(And(x_is_c, *args_sub))
 
-            for sub in c.all_children():
-                if sub is c:
-                    options.append(x == c_literal)
-                else:
-                    options.append(x == sub.get_literal_with_args(x))
-            for tv in self.tvs:
-                option = And(Or(*[m == m_tv for m_tv in self.tv_to_method[tv]]), x == tv, self._subtype(m, self.upper(tv), c_literal))
-                options.append(option)
+            options.extend(x == c_literal if sub is c else x == sub.get_literal_with_args(x)
+                           for sub in c.all_children())
+            options.extend(And(tvs_in_scope[tv], x == tv, self._subtype(m, self.upper(tv), c_literal))
+                           for tv in self.tvs)
             subtype_expr = self._subtype(m, x, c_literal)
-            axiom = ForAll([x, m] + c.quantified(), subtype_expr == Or(*options),
+            axiom = ForAll([x, m] + quantified, subtype_expr == Or(*options),
                            patterns=[subtype_expr])
             axioms.append(axiom)
 
         for tv in self.tvs:
-            tv_in_scope = Or([m == cm for cm in self.tv_to_method[tv]])
+            tv_in_scope = tvs_in_scope[tv]
             options = [And(tv_in_scope, x == tv), And(tv_in_scope, x == self.none)]
             for tvp in self.tvs:
                 if tvp is tv:
@@ -454,9 +475,9 @@ class Z3Types:
         for i in range(3):
             args = []
             for j in range(i + 1):
-                args.append(self.new_z3_const('v' + str(j + 1), self.type_sort))
+                args.append(self.new_z3_const('v' + str(j + 1), type_sort))
             func = self.generics[i]
-            normal_func = self.new_z3_const('normal_func', self.type_sort)
+            normal_func = self.new_z3_const('normal_func', type_sort)
             literal = func(*args, normal_func)
             axiom = ForAll([x, m] + args + [normal_func], self._subtype(m, literal, x) == ( x == literal),
                            patterns = [self._subtype(m, literal, x)])
@@ -500,13 +521,11 @@ def declare_type_sort(max_tuple_length, max_function_args, classes_to_base, type
     type_sort.declare("bytes")
     type_sort.declare("tuple")
     for cur_len in range(max_tuple_length + 1):     # declare type constructors for tuples up to max length
-        accessors = []
+        name = "tuple_" + str(cur_len)
         # create accessors for the tuple
-        for arg in range(cur_len):
-            accessor = ("tuple_{}_arg_{}".format(cur_len, arg + 1), type_sort)
-            accessors.append(accessor)
+        accessors = [(name + "_arg_" + str(arg + 1), type_sort) for arg in range(cur_len)]
         # declare type constructor for the tuple
-        type_sort.declare("tuple_{}".format(cur_len), *accessors)
+        type_sort.declare(name, *accessors)
     type_sort.declare("list", ("list_arg_0", type_sort))
     # sets
     type_sort.declare("set", ("set_arg_0", type_sort))
@@ -514,26 +533,25 @@ def declare_type_sort(max_tuple_length, max_function_args, classes_to_base, type
     type_sort.declare("dict", ("dict_arg_0", type_sort), ("dict_arg_1", type_sort))
     # functions
     for cur_len in range(max_function_args + 1):    # declare type constructors for functions
+        name = "func_" + str(cur_len)
         # the first accessor of the function is the number of default arguments that the function has
-        accessors = [("func_{}_defaults_args".format(cur_len), IntSort())]
+        accessors = [(name + "_defaults_args", IntSort())]
         # create accessors for the argument types of the function
-        for arg in range(cur_len):
-            accessor = ("func_{}_arg_{}".format(cur_len, arg + 1), type_sort)
-            accessors.append(accessor)
+        accessors += [(name + "_arg_" + str(arg + 1), type_sort) for arg in range(cur_len)]
         # create accessor for the return type of the functio
-        accessors.append(("func_{}_return".format(cur_len), type_sort))
+        accessors.append((name + "_return", type_sort))
         # declare type constructor for the function
-        type_sort.declare("func_{}".format(cur_len), *accessors)
+        type_sort.declare(name, *accessors)
     # classes
     for cls in classes_to_base:
         if isinstance(cls, str):
             if cls in ALIASES:
                 continue
-            type_sort.declare("class_{}".format(cls))
+            type_sort.declare("class_" + cls)
         else:
             if cls[0] in ALIASES:
                 continue
-            type_sort.declare("class_{}".format(cls[0]), *[(a, type_sort) for a in cls[1:]])
+            type_sort.declare("class_" + cls[0], *[(a, type_sort) for a in cls[1:]])
 
     return type_sort.create()
 
@@ -542,6 +560,7 @@ def create_classes_attributes(type_sort, classes_to_attrs, attributes_map):
     for cls in classes_to_attrs:
         attrs = classes_to_attrs[cls]
         attributes_map[cls] = OrderedDict()
+        prefix = "class_" + cls + "_attr_"
         for attr in attrs:
-            attribute = Const("class_{}_attr_{}".format(cls, attr), type_sort)
+            attribute = Const(prefix + attr, type_sort)
             attributes_map[cls][attr] = attribute
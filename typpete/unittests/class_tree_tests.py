@@ -0,0 +1,71 @@
+import unittest
+from collections import OrderedDict
+
+from typpete.src.z3_types import Z3Types
+
+
+def tree_edges(tree):
+    """Get the set of (base, subclass) names of all the edges in the class tree"""
+    edges = set()
+    to_visit = [tree]
+    while to_visit:
+        node = to_visit.pop()
+        for child in node.children:
+            edges.add((node.name, child.name))
+            to_visit.append(child)
+    return edges
+
+
+class TestClassTree(unittest.TestCase):
+    # A <- B, A <- C, B <- D, C <- D
+    diamond = [
+        ('class_A', ['object']),
+        ('class_B', ['class_A']),
+        ('class_C', ['class_A']),
+        ('class_D', ['class_B', 'class_C']),
+    ]
+
+    def test_diamond_in_reverse_order(self):
+        """The tree does not depend on the order in which classes are listed"""
+        in_order = Z3Types.create_class_tree(OrderedDict(self.diamond), None)
+        reversed_order = Z3Types.create_class_tree(OrderedDict(reversed(self.diamond)), None)
+
+        expected = {('object', 'class_A'), ('class_A', 'class_B'), ('class_A', 'class_C'),
+                    ('class_B', 'class_D'), ('class_C', 'class_D')}
+        self.assertEqual(tree_edges(in_order), expected)
+        self.assertEqual(tree_edges(reversed_order), expected)
+
+    def test_diamond_closures(self):
+        """Transitive children and parents are computed for every node and cannot be modified"""
+        tree = Z3Types.create_class_tree(OrderedDict(reversed(self.diamond)), None)
+        nodes = {node.name: node for node in tree.all_children()}
+
+        self.assertEqual({n.name for n in tree.all_children()},
+                         {'object', 'class_A', 'class_B', 'class_C', 'class_D'})
+        self.assertEqual({n.name for n in nodes['class_B'].all_children()}, {'class_B', 'class_D'})
+        self.assertEqual({n.name for n in nodes['class_D'].all_parents()},
+                         {'object', 'class_A', 'class_B', 'class_C', 'class_D'})
+        self.assertEqual({n.name for n in nodes['class_C'].all_parents()},
+                         {'object', 'class_A', 'class_C'})
+        self.assertIsInstance(nodes['class_A'].all_children(), frozenset)
+        self.assertIsInstance(nodes['class_A'].all_parents(), frozenset)
+
+    def test_unresolved_base(self):
+        """Classes whose base is not a known class are reported instead of dropped"""
+        all_classes = OrderedDict([
+            ('class_A', ['object']),
+            (('class_G', 'class_G_arg_T'), ['object']),
+            # Bases refer to generic classes by their name only, which is not a key
+            ('class_H', ['class_G']),
+            ('class_I', ['class_H']),
+        ])
+        with self.assertRaises(TypeError) as cm:
+            Z3Types.create_class_tree(all_classes, None)
+        message = str(cm.exception)
+        self.assertIn('class_H', message)
+        self.assertIn('class_I', message)
+        self.assertNotIn('class_A', message)
+
+
+if __name__ == '__main__':
+    unittest.main()